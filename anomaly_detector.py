@@ -0,0 +1,159 @@
+import json
+import logging
+from datetime import datetime
+
+# Configuration
+ANOMALY_FILE = "parking_anomalies.jsonl"
+EWMA_ALPHA = 0.1            # Weight of the newest reading in the rolling mean/variance
+Z_THRESHOLD = 4.0           # Std deviations a change in 'frei' may deviate before it is a jump
+WARMUP_READINGS = 10        # Readings per garage before the z-score check is trusted
+MIN_RATE_STD = 2.0          # Floor for the std deviation of the change in 'frei', in cars per minute
+MAX_CHANGE_RATE = 0.25      # Max change of 'frei' per minute, as a fraction of 'gesamt'
+STALE_AFTER = 15 * 60       # Seconds a 'zeitstempel' may stay unchanged before it is stale
+MAX_REJECTED_READINGS = 3   # Consecutive rate anomalies before a new level is accepted as the baseline
+QUARANTINE_ANOMALIES = False  # Drop anomalous readings from the stored entry instead of flagging them
+
+# Anomalies that make a reading unusable; these never update the garage statistics
+HARD_ANOMALIES = {"invalid_value", "frei_exceeds_gesamt", "negative_frei", "status_nonzero"}
+# Anomalies in the change of 'frei'; the next reading is compared against the last accepted one
+RATE_ANOMALIES = {"change_rate_exceeded", "sudden_jump"}
+
+
+class GarageStats:
+    """Running per-garage state, updated with O(1) work per reading."""
+
+    __slots__ = ("count", "mean", "var", "last_frei", "last_time", "rejected",
+                 "zeitstempel", "zeitstempel_since")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0             # EWMA of the per-minute change in 'frei'
+        self.var = 0.0              # EWMA variance of the per-minute change in 'frei'
+        self.last_frei = None
+        self.last_time = None
+        self.rejected = 0           # Consecutive readings rejected for a rate anomaly
+        self.zeitstempel = None
+        self.zeitstempel_since = None
+
+    def update(self, frei, fetched_at):
+        """Fold a valid reading into the rolling mean/variance of the change rate."""
+        if self.last_frei is not None:
+            minutes = max((fetched_at - self.last_time).total_seconds() / 60, 1e-6)
+            rate = (frei - self.last_frei) / minutes
+            if self.count == 0:
+                self.mean = rate
+            else:
+                diff = rate - self.mean
+                incr = EWMA_ALPHA * diff
+                self.mean += incr
+                self.var = (1 - EWMA_ALPHA) * (self.var + diff * incr)
+            self.count += 1
+        self.rebaseline(frei, fetched_at)
+
+    def rebaseline(self, frei, fetched_at):
+        """Make a reading the reference for the next change rate without updating the statistics."""
+        self.last_frei = frei
+        self.last_time = fetched_at
+        self.rejected = 0
+
+
+class AnomalyDetector:
+    """Online anomaly detector for the BCP occupancy feed."""
+
+    def __init__(self, anomaly_file=ANOMALY_FILE, quarantine=QUARANTINE_ANOMALIES):
+        self.anomaly_file = anomaly_file
+        self.quarantine = quarantine
+        self.stats = {}
+
+    def check_reading(self, reading, fetched_at):
+        """Return the list of anomaly names for a single garage reading."""
+        key = reading.get("bezeichnung") or reading.get("lfdnr")
+        stats = self.stats.setdefault(key, GarageStats())
+        anomalies = []
+
+        # Staleness timer: how long has the feed reported the same 'zeitstempel'?
+        zeitstempel = reading.get("zeitstempel")
+        if zeitstempel != stats.zeitstempel:
+            stats.zeitstempel = zeitstempel
+            stats.zeitstempel_since = fetched_at
+        elif (fetched_at - stats.zeitstempel_since).total_seconds() > STALE_AFTER:
+            anomalies.append("stale_timestamp")
+
+        try:
+            frei = int(reading.get("frei"))
+            gesamt = int(reading.get("gesamt"))
+        except (TypeError, ValueError):
+            anomalies.append("invalid_value")
+            return anomalies
+
+        if frei < 0:
+            anomalies.append("negative_frei")
+        if frei > gesamt:
+            anomalies.append("frei_exceeds_gesamt")
+        if reading.get("status") != "0":
+            anomalies.append("status_nonzero")
+        if HARD_ANOMALIES.intersection(anomalies):
+            return anomalies
+
+        if stats.last_frei is not None:
+            minutes = max((fetched_at - stats.last_time).total_seconds() / 60, 1e-6)
+            rate = (frei - stats.last_frei) / minutes
+            if gesamt > 0 and abs(rate) > MAX_CHANGE_RATE * gesamt:
+                anomalies.append("change_rate_exceeded")
+            elif stats.count >= WARMUP_READINGS:
+                # Without a floor the variance shrinks towards 0 while a garage is quiet and every car becomes a jump
+                std = max(stats.var ** 0.5, MIN_RATE_STD)
+                if abs(rate - stats.mean) > Z_THRESHOLD * std:
+                    anomalies.append("sudden_jump")
+
+        if RATE_ANOMALIES.intersection(anomalies):
+            if stats.rejected < MAX_REJECTED_READINGS:
+                # Keep the spike out of the baseline so the next good reading is judged against the last accepted one
+                stats.rejected += 1
+                return anomalies
+            # The garage has stayed at the new level; accept it without folding the jump into the statistics
+            stats.rebaseline(frei, fetched_at)
+            return [a for a in anomalies if a not in RATE_ANOMALIES]
+
+        stats.update(frei, fetched_at)
+        return anomalies
+
+    def check_entry(self, entry):
+        """Check every reading of a parsed entry, flag or quarantine anomalies and log them."""
+        fetched_at = datetime.fromisoformat(entry["timestamp"])
+        records = []
+        kept = []
+        for reading in entry["data"]:
+            anomalies = self.check_reading(reading, fetched_at)
+            if anomalies:
+                records.append({
+                    "timestamp": entry["timestamp"],
+                    "lfdnr": reading.get("lfdnr"),
+                    "bezeichnung": reading.get("bezeichnung"),
+                    "frei": reading.get("frei"),
+                    "gesamt": reading.get("gesamt"),
+                    "status": reading.get("status"),
+                    "zeitstempel": reading.get("zeitstempel"),
+                    "anomalies": anomalies,
+                    "quarantined": self.quarantine
+                })
+                if self.quarantine:
+                    continue
+                reading["anomalies"] = anomalies
+            kept.append(reading)
+        entry["data"] = kept
+
+        if records:
+            logging.warning(f"Detected {len(records)} anomalous readings: "
+                            + ", ".join(f"{r['bezeichnung']} ({', '.join(r['anomalies'])})" for r in records))
+            self.write_anomalies(records)
+        return records
+
+    def write_anomalies(self, records):
+        """Append anomaly records to the JSON Lines anomaly stream."""
+        try:
+            with open(self.anomaly_file, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+        except Exception as e:
+            logging.error(f"Failed to write anomalies to {self.anomaly_file}: {e}")
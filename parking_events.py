@@ -0,0 +1,189 @@
+import json
+import queue
+import time
+import threading
+import logging
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Configuration
+EVENT_HOST = "127.0.0.1"
+EVENT_PORT = 8051
+EVENT_LOG_SIZE = 10000      # Past events kept for clients resuming with Last-Event-ID
+SUBSCRIBER_QUEUE_SIZE = 1000  # Undelivered events per subscriber before it is disconnected
+KEEPALIVE_INTERVAL = 15     # Seconds between SSE keep-alive comments on an idle stream
+WRITE_TIMEOUT = 30          # Seconds a write may block on a client that stopped reading before it is closed
+
+
+class Subscriber:
+    """A single event stream client with its own bounded delivery queue."""
+
+    def __init__(self, garages=None, cities=None):
+        self.garages = garages
+        self.cities = cities
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event):
+        data = event["data"]
+        if self.garages and data.get("bezeichnung") not in self.garages and data.get("lfdnr") not in self.garages:
+            return False
+        if self.cities and data.get("city") not in self.cities:
+            return False
+        return True
+
+
+class EventBroker:
+    """Fans out per-garage change events to subscribers and keeps a replayable log.
+
+    Every event gets an id '<epoch>-<sequence>', where the epoch is the broker's
+    start time, so ids from a previous fetcher run are never mistaken for ids of
+    this one. A subscriber whose queue fills up is dropped rather than slowing
+    down the fetcher; it reconnects with the last id it received and catches up
+    from the event log.
+    """
+
+    def __init__(self, city, log_size=EVENT_LOG_SIZE):
+        self.city = city
+        self.epoch = int(time.time() * 1000)
+        self.lock = threading.Lock()
+        self.log = deque(maxlen=log_size)
+        self.next_id = 1
+        self.subscribers = set()
+        self.last_state = {}
+
+    def publish(self, event_type, data):
+        with self.lock:
+            event = {"id": self.next_id, "event": event_type, "data": data}
+            self.next_id += 1
+            self.log.append(event)
+            for subscriber in list(self.subscribers):
+                if not subscriber.matches(event):
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    subscriber.overflowed = True
+                    self.subscribers.discard(subscriber)
+                    logging.warning("Dropped slow event subscriber; it can resume from its last event id.")
+
+    def publish_entry(self, entry, anomalies=()):
+        """Publish frei, status and anomaly events for a parsed feed entry."""
+        for reading in entry["data"]:
+            key = reading.get("bezeichnung") or reading.get("lfdnr")
+            previous = self.last_state.get(key)
+            data = {
+                "city": self.city,
+                "timestamp": entry["timestamp"],
+                "lfdnr": reading.get("lfdnr"),
+                "bezeichnung": reading.get("bezeichnung"),
+                "gesamt": reading.get("gesamt"),
+                "frei": reading.get("frei"),
+                "status": reading.get("status")
+            }
+            if previous is None or previous.get("frei") != reading.get("frei"):
+                self.publish("frei", {**data, "previous": previous.get("frei") if previous else None})
+            if previous is not None and previous.get("status") != reading.get("status"):
+                self.publish("status", {**data, "previous": previous.get("status")})
+            self.last_state[key] = reading
+        for record in anomalies:
+            self.publish("anomaly", {"city": self.city, **record})
+
+    def format_id(self, sequence):
+        return f"{self.epoch}-{sequence}"
+
+    def subscribe(self, garages=None, cities=None, last_id=None):
+        """Register a subscriber and queue any events it missed since last_id.
+
+        last_id is an event id string as sent to the client; a ValueError is
+        raised if it is malformed.
+        """
+        subscriber = Subscriber(garages, cities)
+        if last_id is not None:
+            epoch, _, sequence = last_id.rpartition("-")
+            # Ids without an epoch can only come from an older fetcher run
+            epoch, last_id = int(epoch) if epoch else None, int(sequence)
+        with self.lock:
+            if last_id is not None:
+                oldest = self.log[0]["id"] if self.log else self.next_id
+                if epoch != self.epoch or last_id + 1 < oldest or last_id >= self.next_id:
+                    # The missed events are no longer in the log; the client has to reload
+                    subscriber.queue.put_nowait({"id": self.next_id - 1, "event": "reset", "data": {}})
+                else:
+                    backlog = [event for event in self.log if event["id"] > last_id and subscriber.matches(event)]
+                    for event in backlog[:SUBSCRIBER_QUEUE_SIZE]:
+                        subscriber.queue.put_nowait(event)
+                    if len(backlog) > SUBSCRIBER_QUEUE_SIZE:
+                        subscriber.overflowed = True
+                        return subscriber
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+
+class EventStreamHandler(BaseHTTPRequestHandler):
+    """Serves /events as a Server-Sent Events stream.
+
+    Query parameters: garage=<bezeichnung or lfdnr>[,...], city=<city>[,...]
+    and last_event_id=<id> (or the Last-Event-ID header) to resume a stream.
+    """
+
+    broker = None
+    disable_nagle_algorithm = True
+    timeout = WRITE_TIMEOUT
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/events":
+            self.send_error(404, f"Unknown endpoint {url.path}")
+            return
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        garages = set(params["garage"].split(",")) if params.get("garage") else None
+        cities = set(params["city"].split(",")) if params.get("city") else None
+        last_id = self.headers.get("Last-Event-ID") or params.get("last_event_id") or None
+        try:
+            subscriber = self.broker.subscribe(garages, cities, last_id)
+        except ValueError:
+            self.send_error(400, "Invalid Last-Event-ID")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while True:
+                try:
+                    event = subscriber.queue.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    if subscriber.overflowed:
+                        break
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                message = f"id: {self.broker.format_id(event['id'])}\nevent: {event['event']}\ndata: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+                self.wfile.write(message.encode("utf-8"))
+                self.wfile.flush()
+                if subscriber.overflowed and subscriber.queue.empty():
+                    break
+        except OSError as e:
+            # Disconnected clients and stalled ones hitting WRITE_TIMEOUT; either way the thread is freed
+            logging.debug(f"Closing event stream for {self.address_string()}: {e}")
+        finally:
+            self.broker.unsubscribe(subscriber)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def start_event_server(broker, host=EVENT_HOST, port=EVENT_PORT):
+    """Serve the broker's event stream from a background thread."""
+    EventStreamHandler.broker = broker
+    server = ThreadingHTTPServer((host, port), EventStreamHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Publishing change events on http://{host}:{port}/events")
+    return server
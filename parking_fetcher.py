@@ -4,11 +4,14 @@ import json
 import time
 import logging
 from datetime import datetime
+from anomaly_detector import AnomalyDetector
+from parking_events import EventBroker, start_event_server
 
 # Configuration
 XML_URL = "https://www.bcp-bonn.de/stellplatz/bcpext.xml"
 OUTPUT_FILE = "parking_data.json"
 LOG_FILE = "parking_fetcher.log"
+CITY = "bonn"               # City tag attached to published change events
 MAX_RUNS = 60               # Max number of fetches
 FETCH_INTERVAL = 60         # Seconds between fetches
 MAX_RETRIES = 3             # Retry count on failure
@@ -74,6 +77,13 @@ def write_json_entry(entry, filepath):
 def main():
     logging.info("Starting parking data fetcher.")
     run_counter = 0
+    detector = AnomalyDetector()
+    broker = EventBroker(CITY)
+    try:
+        event_server = start_event_server(broker)
+    except OSError as e:
+        logging.error(f"Could not start the change event server, continuing without publishing: {e}")
+        broker = event_server = None
 
     while run_counter < MAX_RUNS:
         logging.info(f"Run {run_counter + 1}/{MAX_RUNS}")
@@ -83,7 +93,14 @@ def main():
         if xml_data:
             try:
                 json_entry = parse_xml_to_json(xml_data)
+                try:
+                    anomalies = detector.check_entry(json_entry)
+                except Exception as e:
+                    logging.error(f"Anomaly detection failed, storing entry unchecked: {e}")
+                    anomalies = []
                 write_json_entry(json_entry, OUTPUT_FILE)
+                if broker:
+                    broker.publish_entry(json_entry, anomalies)
             except Exception as e:
                 logging.error(f"Error while parsing or writing data: {e}")
         else:
@@ -93,6 +110,9 @@ def main():
         time.sleep(FETCH_INTERVAL)
 
     logging.info("Reached maximum run count. Exiting.")
+    if event_server:
+        event_server.shutdown()
+        event_server.server_close()
 
 if __name__ == "__main__":
     try:
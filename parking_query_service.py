@@ -0,0 +1,380 @@
+import json
+import gzip
+import os
+import threading
+import logging
+from collections import deque
+from itertools import chain
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Configuration
+DATA_FILE = "parking_data.json"
+HOST = "127.0.0.1"
+PORT = 8050
+RING_BUFFER_SIZE = 1440     # Recent snapshots kept in memory (one day at one fetch per minute)
+REFRESH_INTERVAL = 10       # Seconds between checks of DATA_FILE for new snapshots
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_SIZE = 1024        # Responses smaller than this are sent uncompressed
+READ_CHUNK_SIZE = 64 * 1024  # Bytes read at a time when streaming DATA_FILE
+INDEX_STRIDE = 60           # Snapshots between the file offsets remembered for older ranges
+
+# Origin for /aggregate buckets; stored timestamps are naive local time, so buckets align to local midnight
+LOCAL_EPOCH = datetime(1970, 1, 1)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+
+
+def to_int(value):
+    """Convert a numeric string from the feed to int, or None if it is not numeric."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compact_reading(timestamp, reading):
+    """Reduce a raw feed reading to the fields served by the query service."""
+    return {
+        "timestamp": timestamp,
+        "lfdnr": reading.get("lfdnr"),
+        "bezeichnung": reading.get("bezeichnung"),
+        "gesamt": to_int(reading.get("gesamt")),
+        "frei": to_int(reading.get("frei")),
+        "status": reading.get("status"),
+        "zeitstempel": reading.get("zeitstempel"),
+        "tendenz": reading.get("tendenz")
+    }
+
+
+def garage_key(reading):
+    """Key under which a garage's readings are indexed."""
+    return reading.get("bezeichnung") or reading.get("lfdnr")
+
+
+def iter_entries(filepath, offset=0):
+    """Stream the snapshots of the JSON array in filepath, starting at byte offset.
+
+    Yields (entry, start, end) with the byte offsets of each snapshot. The
+    fetcher writes the file with json.dump's default ensure_ascii, so character
+    and byte offsets are the same. Raises json.JSONDecodeError if the array is
+    not closed, e.g. while the fetcher is rewriting the file.
+    """
+    decoder = json.JSONDecoder()
+    with open(filepath, "rb") as f:
+        f.seek(offset)
+        buffer, base, pos = "", offset, 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[":
+                pos += 1
+            if pos < len(buffer) and buffer[pos] == "]":
+                return
+            try:
+                if pos == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, pos)
+                entry, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise json.JSONDecodeError(f"Unexpected end of {filepath}", buffer, pos)
+                buffer, base, pos = buffer[pos:] + chunk.decode("utf-8"), base + pos, 0
+                continue
+            yield entry, base + pos, base + end
+            pos = end
+
+
+def index_entry(entry):
+    """Turn a stored snapshot into (time, {garage: compact reading})."""
+    readings = {}
+    for reading in entry.get("data", []):
+        readings[garage_key(reading)] = compact_reading(entry["timestamp"], reading)
+    return datetime.fromisoformat(entry["timestamp"]), readings
+
+
+class OccupancyStore:
+    """Latest state and recent snapshots of every garage, shared by all request threads.
+
+    Snapshots in the ring buffer are served from memory. Older ranges are
+    streamed from DATA_FILE per query, starting at the nearest of the file
+    offsets remembered every INDEX_STRIDE snapshots, so memory stays bounded.
+    """
+
+    def __init__(self, filepath=DATA_FILE, ring_size=RING_BUFFER_SIZE):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=ring_size)
+        self.latest = {}
+        self.mtime = None
+        self.consumed = 0           # Snapshots of DATA_FILE indexed so far
+        self.offset = 0             # Byte offset just after the last indexed snapshot
+        self.index = []             # (time, byte offset, position) of every INDEX_STRIDE-th snapshot
+        # Immutable views swapped in on refresh so readers never need the lock
+        self._current = (None, ())
+        self._recent = (0, ())      # (position of the first ring snapshot, ring snapshots)
+        self._index = ()
+        self._aliases = {}
+
+
+    def _appended_since(self, offset):
+        """Return True if the file still holds the snapshots indexed up to offset.
+
+        The fetcher re-dumps the existing snapshots unchanged and appends new
+        ones, so the bytes before offset stay the same while the file grows.
+        """
+        if offset == 0:
+            return True
+        with open(self.filepath, "rb") as f:
+            f.seek(offset - 1)
+            tail = f.read(64)
+        return tail[:1] == b"}" and tail[1:].lstrip()[:1] in (b",", b"]")
+
+    def refresh(self):
+        """Index the snapshots appended to DATA_FILE since the last refresh.
+
+        Only the new snapshots are parsed. If the file no longer continues the
+        indexed snapshots (truncated or replaced), the index is rebuilt.
+        """
+        try:
+            mtime = os.path.getmtime(self.filepath)
+            if mtime == self.mtime:
+                return
+            rebuild = not self._appended_since(self.offset)
+            offset = 0 if rebuild else self.offset
+            # Only commit once the whole array was read; a half-written file is retried on the next refresh
+            new = [(entry["timestamp"], *index_entry(entry), start, end)
+                   for entry, start, end in iter_entries(self.filepath, offset)]
+        except (OSError, ValueError) as e:
+            logging.warning(f"Failed to load {self.filepath}: {e}")
+            return
+
+        with self.lock:
+            if rebuild:
+                logging.info(f"{self.filepath} was rewritten; rebuilding the index")
+                self.recent.clear()
+                self.latest = {}
+                self.consumed = 0
+                self.offset = 0
+                self.index = []
+                self._current = (None, ())
+            timestamp = self._current[0]
+            for timestamp, time, readings, start, end in new:
+                if self.consumed % INDEX_STRIDE == 0:
+                    self.index.append((time, start, self.consumed))
+                self.recent.append((time, readings))
+                self.latest.update(readings)
+                self.consumed += 1
+                self.offset = end
+            added = len(new)
+            view = tuple(self.recent)
+            self._recent = (self.consumed - len(view), view)
+            self._index = tuple(self.index)
+            self._current = (timestamp, tuple(self.latest.values()))
+            aliases = {}
+            for key, reading in self.latest.items():
+                for alias in (reading["lfdnr"], reading["bezeichnung"]):
+                    if alias:
+                        aliases[alias] = key
+            self._aliases = aliases
+            self.mtime = mtime
+        logging.info(f"Loaded {added} new snapshots from {self.filepath}")
+
+    def _older_snapshots(self, start, end, ring_start):
+        """Stream the snapshots between start and end that precede the ring buffer from DATA_FILE."""
+        index = self._index
+        if not index:
+            return
+        # Clocks fall back by at most an hour, so snapshots in range lie between the
+        # index point preceding the first one within an hour before start and the first one an hour past end
+        k = next((i for i, (time, _, _) in enumerate(index) if time >= start - timedelta(hours=1)), len(index))
+        _, offset, position = index[max(k - 1, 0)]
+        stop = ring_start
+        if end is not None:
+            limit = end + timedelta(hours=1)
+            stop = min(stop, next((p for time, _, p in index[k:] if time > limit), stop))
+        for entry, _, _ in iter_entries(self.filepath, offset):
+            if position >= stop:
+                return
+            position += 1
+            time = datetime.fromisoformat(entry["timestamp"])
+            if time >= start and (end is None or time <= end):
+                yield index_entry(entry)
+
+    def snapshots_between(self, start, end):
+        """Yield the snapshots with start <= time <= end in file order.
+
+        Without start only the ring buffer is searched. Timestamps are naive
+        local time and repeat on the DST fall-back night, so snapshots are
+        filtered one by one instead of bisected.
+        """
+        ring_start, view = self._recent
+        snapshots = view
+        if start is not None and ring_start > 0 and (not view or start < view[0][0]):
+            snapshots = chain(self._older_snapshots(start, end, ring_start), view)
+        for snapshot in snapshots:
+            if (start is None or snapshot[0] >= start) and (end is None or snapshot[0] <= end):
+                yield snapshot
+
+    def resolve(self, garage):
+        """Map a bezeichnung or lfdnr to the key the garage is indexed under."""
+        return self._aliases.get(garage, garage)
+
+    def current(self, garage=None):
+        timestamp, garages = self._current
+        if garage is not None:
+            key = self.resolve(garage)
+            return timestamp, [g for g in garages if garage_key(g) == key]
+        return timestamp, list(garages)
+
+    def history(self, garage, start, end):
+        garage = self.resolve(garage)
+        return [readings[garage] for _, readings in self.snapshots_between(start, end) if garage in readings]
+
+    def aggregate(self, garage, interval, start, end):
+        """Bucket the readings of a garage into fixed intervals of `interval` seconds of local time."""
+        garage = self.resolve(garage)
+        buckets = {}
+        for time, readings in self.snapshots_between(start, end):
+            reading = readings.get(garage)
+            if reading is None or reading["frei"] is None:
+                continue
+            key = int((time - LOCAL_EPOCH).total_seconds()) // interval * interval
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {"count": 0, "sum": 0, "min": reading["frei"], "max": reading["frei"], "gesamt": reading["gesamt"]}
+            bucket["count"] += 1
+            bucket["sum"] += reading["frei"]
+            bucket["min"] = min(bucket["min"], reading["frei"])
+            bucket["max"] = max(bucket["max"], reading["frei"])
+        result = []
+        for key in sorted(buckets):
+            bucket = buckets[key]
+            mean = bucket["sum"] / bucket["count"]
+            gesamt = bucket["gesamt"]
+            result.append({
+                "start": (LOCAL_EPOCH + timedelta(seconds=key)).isoformat(),
+                "count": bucket["count"],
+                "frei_mean": round(mean, 2),
+                "frei_min": bucket["min"],
+                "frei_max": bucket["max"],
+                "occupancy_mean": round(1 - mean / gesamt, 4) if gesamt else None
+            })
+        return result
+
+
+def paginate(items, params):
+    """Slice items according to the offset/limit query parameters."""
+    offset = max(int(params.get("offset", 0)), 0)
+    limit = min(max(int(params.get("limit", DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    return {
+        "total": len(items),
+        "offset": offset,
+        "limit": limit,
+        "items": items[offset:offset + limit]
+    }
+
+
+def parse_time(value):
+    """Parse an ISO timestamp query parameter as naive local time, like the stored timestamps."""
+    if not value:
+        return None
+    time = datetime.fromisoformat(value)
+    if time.tzinfo is not None:
+        time = time.astimezone().replace(tzinfo=None)
+    return time
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Serves /current, /history and /aggregate from the shared OccupancyStore."""
+
+    store = None
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/current":
+                timestamp, garages = self.store.current(params.get("garage"))
+                body = {"timestamp": timestamp, **paginate(garages, params)}
+            elif url.path == "/history":
+                garage = params["garage"]
+                items = self.store.history(garage, parse_time(params.get("start")), parse_time(params.get("end")))
+                body = {"garage": garage, **paginate(items, params)}
+            elif url.path == "/aggregate":
+                garage = params["garage"]
+                interval = int(params.get("interval", 900))
+                if interval <= 0:
+                    raise ValueError("interval must be positive")
+                items = self.store.aggregate(garage, interval, parse_time(params.get("start")), parse_time(params.get("end")))
+                body = {"garage": garage, "interval": interval, **paginate(items, params)}
+            else:
+                self.send_json({"error": f"Unknown endpoint {url.path}"}, 404)
+                return
+        except KeyError as e:
+            self.send_json({"error": f"Missing query parameter: {e}"}, 400)
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Failed to read occupancy history: {e}")
+            self.send_json({"error": "Occupancy history is unavailable"}, 503)
+            return
+        except ValueError as e:
+            self.send_json({"error": f"Invalid query parameter: {e}"}, 400)
+            return
+        except Exception as e:
+            logging.error(f"Error while handling {self.path}: {e}", exc_info=True)
+            self.send_json({"error": "Internal server error"}, 500)
+            return
+        self.send_json(body)
+
+    def send_json(self, body, status=200):
+        """Send a compact JSON response, gzip-compressed when the client accepts it."""
+        payload = json.dumps(body, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if len(payload) >= GZIP_MIN_SIZE and "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def refresh_loop(store, stop_event):
+    while not stop_event.wait(REFRESH_INTERVAL):
+        try:
+            store.refresh()
+        except Exception as e:
+            logging.error(f"Error while refreshing occupancy data: {e}")
+
+
+def main():
+    store = OccupancyStore()
+    store.refresh()
+    QueryHandler.store = store
+
+    stop_event = threading.Event()
+    threading.Thread(target=refresh_loop, args=(store, stop_event), daemon=True).start()
+
+    server = ThreadingHTTPServer((HOST, PORT), QueryHandler)
+    server.daemon_threads = True
+    logging.info(f"Serving occupancy queries on http://{HOST}:{PORT}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Shutting down query service.")
+    finally:
+        stop_event.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()